@@ -2,11 +2,10 @@
 Vytvoření bigramové matice z českého textu.
 """
 
+import argparse
 import numpy as np
 from substitution_cipher import BigramAnalysis
 import pickle
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 
 
@@ -30,6 +29,9 @@ def create_and_save_bigram_matrix():
     os.makedirs('data', exist_ok=True)
     np.save('data/czech_bigram_matrix.npy', bigram_matrix)
     
+    # Uložení logaritmů matice, aby je kryptoanalýza nemusela při každém spuštění počítat
+    np.save('data/czech_log_bigram_matrix.npy', BigramAnalysis.log_matrix(bigram_matrix))
+    
     # Uložení také jako pickle pro snadnější načítání s metadaty
     with open('data/czech_bigram_data.pkl', 'wb') as f:
         pickle.dump({
@@ -49,9 +51,12 @@ def create_and_save_bigram_matrix():
     
     # Nejčastější bigramy
     print("\nNejčastější bigramy:")
-    indices = np.unravel_index(np.argsort(bigram_matrix, axis=None)[-10:], bigram_matrix.shape)
-    for i in range(9, -1, -1):
-        row, col = indices[0][i], indices[1][i]
+    # Stačí vybrat 10 největších hodnot (argpartition) a seřadit jen ty, ne celou matici
+    flat = bigram_matrix.ravel()
+    top_idx = np.argpartition(flat, -10)[-10:]
+    top_idx = top_idx[np.argsort(flat[top_idx])[::-1]]
+    rows, cols = np.unravel_index(top_idx, bigram_matrix.shape)
+    for row, col in zip(rows, cols):
         bigram = analyzer.alphabet[row] + analyzer.alphabet[col]
         prob = bigram_matrix[row, col]
         print(f"  {bigram}: {prob:.4f}")
@@ -62,6 +67,10 @@ def create_and_save_bigram_matrix():
 def visualize_bigram_matrix(matrix, analyzer):
     """Vizualizuje bigramovou matici."""
     
+    # Import až zde - matplotlib/seaborn jsou potřeba jen pro vizualizaci
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     plt.figure(figsize=(12, 10))
     
     # Použij logaritmické měřítko pro lepší vizualizaci
@@ -84,5 +93,11 @@ def visualize_bigram_matrix(matrix, analyzer):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vytvoření bigramové matice z textu Krakatit.")
+    parser.add_argument('--visualize', action='store_true',
+                        help="uloží také vizualizaci matice do data/bigram_matrix_visualization.png")
+    args = parser.parse_args()
+    
     matrix, analyzer = create_and_save_bigram_matrix()
-    visualize_bigram_matrix(matrix, analyzer)
\ No newline at end of file
+    if args.visualize:
+        visualize_bigram_matrix(matrix, analyzer)
\ No newline at end of file
@@ -2,125 +2,451 @@
 Kryptoanalýza substituční šifry pomocí Metropolis-Hastings algoritmu.
 """
 
+import math
+from functools import lru_cache
 import numpy as np
-import random
-from typing import Dict, Tuple, List
-from substitution_cipher import SubstitutionCipher, BigramAnalysis
-import pickle
+from typing import Dict, Tuple, Optional
+from numba import njit, prange
+from substitution_cipher import SubstitutionCipher, BigramAnalysis, bigram_pairs
+
+
+@njit(cache=True, fastmath=True)
+def _bigram_fitness(perm, left, right, log_ref):
+    """Průměrná log-pravděpodobnost bigramů textu dešifrovaného permutací perm."""
+    total = 0.0
+    for k in range(left.shape[0]):
+        total += float(log_ref[perm[left[k]], perm[right[k]]])
+    return total / left.shape[0]
+
+
+@njit(cache=True, fastmath=True)
+def _swap_delta(perm, left, right, log_ref, pair_index, pair_start, a, b):
+    """
+    Prohodí v permutaci znaky a, b a vrátí změnu součtu log-pravděpodobností.
+    
+    Přepočítávají se jen bigramy, které obsahují šifrový znak a nebo b.
+    """
+    old_sum = 0.0
+    new_sum = 0.0
+    for k in range(pair_start[a], pair_start[a + 1]):
+        p = pair_index[k]
+        old_sum += float(log_ref[perm[left[p]], perm[right[p]]])
+    for k in range(pair_start[b], pair_start[b + 1]):
+        p = pair_index[k]
+        # Bigramy obsahující oba znaky už byly započítány u znaku a
+        if left[p] != a and right[p] != a:
+            old_sum += float(log_ref[perm[left[p]], perm[right[p]]])
+    
+    perm[a], perm[b] = perm[b], perm[a]
+    
+    for k in range(pair_start[a], pair_start[a + 1]):
+        p = pair_index[k]
+        new_sum += float(log_ref[perm[left[p]], perm[right[p]]])
+    for k in range(pair_start[b], pair_start[b + 1]):
+        p = pair_index[k]
+        if left[p] != a and right[p] != a:
+            new_sum += float(log_ref[perm[left[p]], perm[right[p]]])
+    return new_sum - old_sum
+
+
+@njit(cache=True, fastmath=True)
+def _estimate_initial_temp(left, right, log_ref, pair_index, pair_start, perm,
+                           samples, acceptance, seed):
+    """
+    Odhadne počáteční teplotu tak, aby se horší kandidáti přijímali
+    zhruba s pravděpodobností acceptance.
+    
+    Provede samples zkušebních prohození, zprůměruje zhoršení fitness
+    a vrátí teplotu T, pro kterou exp(-průměrné zhoršení / T) = acceptance.
+    """
+    np.random.seed(seed)
+    alphabet_size = perm.shape[0]
+    n_pairs = left.shape[0]
+    work_perm = perm.copy()
+    
+    total_worsening = 0.0
+    worse_count = 0
+    for _ in range(samples):
+        a = np.random.randint(0, alphabet_size)
+        b = np.random.randint(0, alphabet_size - 1)
+        if b >= a:
+            b += 1
+        delta = _swap_delta(work_perm, left, right, log_ref, pair_index, pair_start, a, b) / n_pairs
+        work_perm[a], work_perm[b] = work_perm[b], work_perm[a]
+        if delta < 0:
+            total_worsening -= delta
+            worse_count += 1
+    
+    if worse_count == 0:
+        return 1.0
+    return (total_worsening / worse_count) / -math.log(acceptance)
+
+
+@njit(cache=True, fastmath=True)
+def _mh_core(left, right, log_ref, pair_index, pair_start, perm, iterations,
+             initial_temp, alpha, epoch_len, patience, seed, report_every, track_history):
+    """
+    Jádro Metropolis-Hastings algoritmu nad permutací indexů.
+    
+    Teplota se geometricky snižuje: po každých epoch_len iteracích
+    se vynásobí koeficientem alpha. Pokud se nejlepší fitness nezlepší
+    během patience iterací, výpočet skončí předčasně.
+    
+    Vrací nejlepší permutaci, její fitness, počet provedených iterací,
+    historii fitness (prázdnou, pokud track_history není nastaveno)
+    a nejlepší permutace zaznamenané vždy po report_every iteracích
+    (pro výpis průběhu).
+    """
+    np.random.seed(seed)
+    alphabet_size = perm.shape[0]
+    n_pairs = left.shape[0]
+    
+    current_perm = perm.copy()
+    current_fitness = _bigram_fitness(current_perm, left, right, log_ref)
+    best_perm = current_perm.copy()
+    best_fitness = current_fitness
+    
+    if track_history:
+        fitness_history = np.empty(iterations + 1, dtype=np.float32)
+        fitness_history[0] = current_fitness
+    else:
+        fitness_history = np.empty(0, dtype=np.float32)
+    checkpoints = np.empty((iterations // report_every, alphabet_size), dtype=perm.dtype)
+    
+    inv_temperature = 1.0 / initial_temp
+    # Odpočty do dalšího ochlazení a záznamu průběhu (levnější než modulo v každé iteraci)
+    steps_to_cooling = epoch_len
+    steps_to_report = report_every
+    n_checkpoints = 0
+    stall_counter = 0
+    done = iterations
+    for i in range(iterations):
+        # Nový kandidát vznikne prohozením dvou znaků přímo v současné permutaci
+        # Dvojice různých znaků se losuje bez opakování (b se posune za a)
+        a = np.random.randint(0, alphabet_size)
+        b = np.random.randint(0, alphabet_size - 1)
+        if b >= a:
+            b += 1
+        delta = _swap_delta(current_perm, left, right, log_ref, pair_index, pair_start, a, b) / n_pairs
+        
+        # Akceptuj lepší řešení nebo horší s určitou pravděpodobností
+        # (exp se počítá jen pro horší kandidáty; math.exp je i bez Numby levná skalární funkce)
+        if delta > 0 or np.random.random() < math.exp(delta * inv_temperature):
+            current_fitness += delta
+            
+            if current_fitness > best_fitness:
+                best_perm[:] = current_perm
+                best_fitness = current_fitness
+                stall_counter = -1
+        else:
+            # Zamítnutý kandidát - vrať prohození zpět
+            current_perm[a], current_perm[b] = current_perm[b], current_perm[a]
+        
+        if track_history:
+            fitness_history[i + 1] = current_fitness
+        
+        # Postupné snižování teploty (simulated annealing)
+        steps_to_cooling -= 1
+        if steps_to_cooling == 0:
+            inv_temperature /= alpha
+            steps_to_cooling = epoch_len
+        
+        steps_to_report -= 1
+        if steps_to_report == 0:
+            checkpoints[n_checkpoints] = best_perm
+            n_checkpoints += 1
+            steps_to_report = report_every
+        
+        # Předčasné ukončení, pokud se nejlepší řešení dlouho nezlepšilo
+        stall_counter += 1
+        if stall_counter > patience:
+            done = i + 1
+            break
+    
+    if track_history:
+        fitness_history = fitness_history[:done + 1]
+    return best_perm, best_fitness, done, fitness_history, checkpoints[:n_checkpoints]
+
+
+@njit(cache=True, parallel=True)
+def _mh_core_multi(left, right, log_ref, pair_index, pair_start, perms, iterations,
+                   initial_temp, alpha, epoch_len, patience, seeds):
+    """
+    Spustí nezávislé běhy Metropolis-Hastings algoritmu paralelně.
+    
+    Každý běh začíná z vlastní permutace perms[a] s vlastním semínkem seeds[a].
+    Vrací nejlepší fitness a nejlepší permutaci každého běhu.
+    """
+    attempts = perms.shape[0]
+    best_fitnesses = np.empty(attempts)
+    best_perms = np.empty_like(perms)
+    for a in prange(attempts):
+        best_perm, best_fitness, _, _, _ = _mh_core(
+            left, right, log_ref, pair_index, pair_start, perms[a],
+            iterations, initial_temp, alpha, epoch_len, patience, seeds[a],
+            iterations + 1, False
+        )
+        best_fitnesses[a] = best_fitness
+        best_perms[a] = best_perm
+    return best_fitnesses, best_perms
 
 
 class MetropolisHastingsCryptanalysis:
     """Třída pro kryptoanalýzu pomocí Metropolis-Hastings algoritmu."""
     
-    def __init__(self, reference_matrix: np.ndarray, temperature: float = 1.0):
+    def __init__(self, reference_matrix: np.ndarray, temperature: Optional[float] = 1.0,
+                 alpha: Optional[float] = None, epoch_len: int = 500,
+                 log_reference_matrix: Optional[np.ndarray] = None,
+                 final_temp_ratio: float = 1e-4):
         """
         Inicializace kryptoanalýzy.
         
         Args:
             reference_matrix: Referenční bigramová matice.
-            temperature: Teplota pro Metropolis-Hastings algoritmus.
+            temperature: Počáteční teplota pro Metropolis-Hastings algoritmus
+                (None = odhadne se z textu tak, aby se ~80 % horších kandidátů přijalo).
+            alpha: Koeficient geometrického chlazení (None = odvodí se z počtu iterací,
+                viz _cooling_alpha).
+            epoch_len: Počet iterací mezi dvěma snížením teploty.
+            log_reference_matrix: Předpočítané logaritmy referenční matice
+                (viz load_log_reference_matrix); None = spočítají se z reference_matrix.
+            final_temp_ratio: Poměr konečné a počáteční teploty, pokud alpha není zadáno.
         """
         self.reference_matrix = reference_matrix
         self.temperature = temperature
+        self.alpha = alpha
+        self.epoch_len = epoch_len
+        self.final_temp_ratio = final_temp_ratio
         self.cipher = SubstitutionCipher()
         self.analyzer = BigramAnalysis()
         
-    def _swap_two_chars(self, key: Dict[str, str]) -> Dict[str, str]:
+        # Logaritmy referenční matice se počítají jen jednou, a to rovnou ve float32
+        # a v souvislém (C) uspořádání, které Numba zpracuje nejrychleji
+        if log_reference_matrix is not None:
+            self.log_ref = np.ascontiguousarray(log_reference_matrix, dtype=np.float32)
+        else:
+            self.log_ref = BigramAnalysis.log_matrix(reference_matrix)
+        
+    def _encode_bigrams(self, ciphertext: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Převede zašifrovaný text na pole indexů bigramů.
+        
+        Bigramy obsahující znak mimo abecedu se vynechají, stejně jako
+        v BigramAnalysis.calculate_bigram_score.
+        
+        Args:
+            ciphertext: Zašifrovaný text.
+            
+        Returns:
+            Tuple polí indexů prvních a druhých znaků bigramů.
+        """
+        return bigram_pairs(self.cipher.text_to_indices(ciphertext), self.cipher.alphabet_size)
+    
+    def _index_pairs_by_char(self, left: np.ndarray, right: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pro každý šifrový znak najde bigramy, ve kterých se vyskytuje.
+        
+        Výsledek je ve formátu CSR: bigramy znaku c jsou
+        pair_index[pair_start[c]:pair_start[c + 1]].
+        
+        Args:
+            left: Indexy prvních znaků bigramů zašifrovaného textu.
+            right: Indexy druhých znaků bigramů zašifrovaného textu.
+            
+        Returns:
+            Tuple polí pair_index a pair_start.
+        """
+        positions = np.arange(len(left), dtype=np.int32)
+        # Bigram se dvěma stejnými znaky se u daného znaku uvede jen jednou
+        chars = np.concatenate([left, right[left != right]])
+        pair_positions = np.concatenate([positions, positions[left != right]])
+        
+        order = np.argsort(chars, kind='stable')
+        pair_index = pair_positions[order]
+        pair_start = np.zeros(self.cipher.alphabet_size + 1, dtype=np.int32)
+        pair_start[1:] = np.cumsum(np.bincount(chars, minlength=self.cipher.alphabet_size))
+        return pair_index, pair_start
+    
+    def _initial_temperature(self, temperature: Optional[float], left: np.ndarray, right: np.ndarray,
+                             pair_index: np.ndarray, pair_start: np.ndarray, perm: np.ndarray,
+                             seed: int) -> float:
+        """
+        Vrátí počáteční teplotu - zadanou, nebo odhadnutou z textu.
+        
+        Args:
+            temperature: Teplota pro tento běh (None = teplota instance).
+            left: Indexy prvních znaků bigramů zašifrovaného textu.
+            right: Indexy druhých znaků bigramů zašifrovaného textu.
+            pair_index: Bigramy jednotlivých znaků (viz _index_pairs_by_char).
+            pair_start: Začátky úseků v pair_index (viz _index_pairs_by_char).
+            perm: Počáteční permutace.
+            seed: Semínko generátoru náhodných čísel.
+            
+        Returns:
+            float: Počáteční teplota.
         """
-        Vytvoří nový klíč prohozením dvou náhodných znaků.
+        if temperature is None:
+            temperature = self.temperature
+        if temperature is not None:
+            return temperature
+        return _estimate_initial_temp(left, right, self.log_ref, pair_index, pair_start, perm,
+                                      100, 0.8, seed)
+    
+    def _cooling_alpha(self, iterations: int) -> float:
+        """
+        Vrátí koeficient chlazení pro daný běh.
+        
+        Zadané alpha instance se použije beze změny. Jinak se koeficient odvodí
+        z počtu iterací tak, aby teplota na konci běhu klesla na final_temp_ratio
+        počáteční - pevné alpha (např. 0.95 po 500 iteracích) by za 20 000 iterací
+        snížilo teplotu jen na ~0.13 počáteční a řetězec by nezkonvergoval.
         
         Args:
-            key: Současný klíč.
+            iterations: Počet iterací běhu.
             
         Returns:
-            Dict[str, str]: Nový klíč s prohozenými znaky.
+            float: Koeficient geometrického chlazení.
         """
-        new_key = key.copy()
-        chars = list(self.cipher.alphabet)
-        char1, char2 = random.sample(chars, 2)
-        new_key[char1], new_key[char2] = new_key[char2], new_key[char1]
-        return new_key
+        if self.alpha is not None:
+            return self.alpha
+        return self.final_temp_ratio ** (self.epoch_len / max(iterations, 1))
     
-    def _calculate_fitness(self, text: str) -> float:
+    def _random_start(self, rng: np.random.Generator) -> Tuple[np.ndarray, int]:
         """
-        Vypočítá fitness (vhodnost) textu podle bigramové matice.
+        Vylosuje náhodnou počáteční permutaci a semínko pro jádro algoritmu.
         
         Args:
-            text: Text k vyhodnocení.
+            rng: Generátor náhodných čísel daného běhu.
+            
+        Returns:
+            Tuple obsahující počáteční permutaci a semínko pro _mh_core.
+        """
+        perm = rng.permutation(self.cipher.alphabet_size).astype(np.uint8)
+        return perm, int(rng.integers(0, 2**31 - 1))
+    
+    def _perm_to_key(self, perm: np.ndarray) -> Dict[str, str]:
+        """
+        Převede permutaci indexů zpět na klíč.
+        
+        Args:
+            perm: Permutace pro dešifrování, kde perm[index šifrového znaku] = index původního znaku.
+            
+        Returns:
+            Dict[str, str]: Slovník mapující původní znaky na šifrované.
+        """
+        # Klíč je inverzí permutace pro dešifrování: key_array[perm[i]] = i
+        key_array = np.empty(self.cipher.alphabet_size, dtype=np.uint8)
+        key_array[perm] = np.arange(self.cipher.alphabet_size, dtype=np.uint8)
+        return self.cipher.array_to_key(key_array)
+    
+    def _decrypt_with_perm(self, ciphertext: str, perm: np.ndarray) -> str:
+        """
+        Dešifruje text permutací jedním indexováním do tabulky bajtů.
+        
+        Args:
+            ciphertext: Zašifrovaný text.
+            perm: Permutace pro dešifrování (viz _perm_to_key).
+            
+        Returns:
+            str: Dešifrovaný text.
+        """
+        if not ciphertext.isascii():
+            return self.cipher.decrypt(ciphertext, self._perm_to_key(perm))
+        # Znaky mimo abecedu se zobrazí samy na sebe
+        table = np.arange(256, dtype=np.uint8)
+        alphabet_bytes = self.cipher.alphabet_bytes
+        table[alphabet_bytes] = alphabet_bytes[perm]
+        return table[np.frombuffer(ciphertext.encode('ascii'), dtype=np.uint8)].tobytes().decode('ascii')
+    
+    def _calculate_fitness(self, perm: np.ndarray, left: np.ndarray, right: np.ndarray) -> float:
+        """
+        Vypočítá fitness (vhodnost) dešifrovaného textu podle bigramové matice.
+        
+        Dešifrování je implicitní - bigramy zašifrovaného textu se přes permutaci
+        přímo převedou na bigramy otevřeného textu.
+        
+        Args:
+            perm: Permutace pro dešifrování (viz _perm_to_key).
+            left: Indexy prvních znaků bigramů zašifrovaného textu.
+            right: Indexy druhých znaků bigramů zašifrovaného textu.
             
         Returns:
             float: Fitness skóre (vyšší je lepší).
         """
-        return self.analyzer.calculate_bigram_score(text, self.reference_matrix)
+        if len(left) == 0:
+            return float('-inf')
+        return float(_bigram_fitness(perm, left, right, self.log_ref))
     
     def metropolis_hastings(self, ciphertext: str, iterations: int = 20000, 
-                          print_progress: bool = True) -> Tuple[Dict[str, str], str, List[float]]:
+                          print_progress: bool = True, seed: Optional[int] = None,
+                          track_history: bool = False,
+                          patience: Optional[int] = None,
+                          temperature: Optional[float] = None) -> Tuple[Dict[str, str], str, float, Optional[np.ndarray]]:
         """
         Prolomí šifru pomocí Metropolis-Hastings algoritmu.
         
+        Teplota je lokální pro každé volání, instance se během výpočtu nemění
+        a lze ji bezpečně používat opakovaně.
+        
         Args:
             ciphertext: Zašifrovaný text.
             iterations: Počet iterací algoritmu.
             print_progress: Zda vypisovat průběh.
+            seed: Semínko generátoru náhodných čísel (None = náhodné).
+            track_history: Zda zaznamenávat fitness v každé iteraci.
+            patience: Po kolika iteracích bez zlepšení výpočet skončí (None = nikdy).
+                Počítá se od začátku běhu, kdy je řetězec ještě horký, proto je
+                vhodné jen pro dostatečně nízkou počáteční teplotu.
+            temperature: Počáteční teplota pro tento běh (None = teplota instance).
             
         Returns:
-            Tuple obsahující nejlepší klíč, dešifrovaný text a historii fitness.
+            Tuple obsahující nejlepší klíč, dešifrovaný text, jeho fitness
+            a historii fitness (None, pokud se historie nezaznamenávala).
         """
-        # Inicializace s náhodným klíčem
-        current_key = self.cipher.generate_random_key()
-        current_text = self.cipher.decrypt(ciphertext, current_key)
-        current_fitness = self._calculate_fitness(current_text)
+        # Zašifrovaný text se na indexy bigramů převede jen jednou
+        left, right = self._encode_bigrams(ciphertext)
         
-        # Sledování nejlepšího řešení
-        best_key = current_key.copy()
-        best_text = current_text
-        best_fitness = current_fitness
+        # Inicializace s náhodným klíčem (klíč je během výpočtu reprezentován permutací);
+        # počáteční klíč i semínko jádra určuje jediné semínko, takže běh je reprodukovatelný.
+        # Bez semínka se použije entropie systému - ne globální stav generátoru, který
+        # by po forku sdílely všechny procesy.
+        initial_perm, core_seed = self._random_start(np.random.default_rng(seed))
+        if len(left) == 0:
+            # Text bez bigramů nelze ohodnotit
+            fitness_history = np.array([float('-inf')], dtype=np.float32) if track_history else None
+            return (self._perm_to_key(initial_perm), self._decrypt_with_perm(ciphertext, initial_perm),
+                    float('-inf'), fitness_history)
         
-        # Historie pro vizualizaci
-        fitness_history = [current_fitness]
+        report_every = 1000
+        pair_index, pair_start = self._index_pairs_by_char(left, right)
+        initial_temp = self._initial_temperature(temperature, left, right, pair_index, pair_start,
+                                                 initial_perm, core_seed)
+        best_perm, best_fitness, done, fitness_history, checkpoints = _mh_core(
+            left, right, self.log_ref, pair_index, pair_start, initial_perm,
+            iterations, initial_temp, self._cooling_alpha(iterations), self.epoch_len,
+            iterations if patience is None else patience, core_seed,
+            report_every, track_history
+        )
         
-        # Adaptivní teplota
-        initial_temp = self.temperature
-        
-        for i in range(iterations):
-            # Vytvoř nového kandidáta
-            candidate_key = self._swap_two_chars(current_key)
-            candidate_text = self.cipher.decrypt(ciphertext, candidate_key)
-            candidate_fitness = self._calculate_fitness(candidate_text)
-            
-            # Metropolis-Hastings krok
-            delta = candidate_fitness - current_fitness
-            
-            # Akceptuj lepší řešení nebo horší s určitou pravděpodobností
-            if delta > 0 or random.random() < np.exp(delta / self.temperature):
-                current_key = candidate_key
-                current_text = candidate_text
-                current_fitness = candidate_fitness
-                
-                # Aktualizuj nejlepší řešení
-                if current_fitness > best_fitness:
-                    best_key = current_key.copy()
-                    best_text = current_text
-                    best_fitness = current_fitness
-            
-            fitness_history.append(current_fitness)
-            
-            # Postupné snižování teploty (simulated annealing)
-            if i % 1000 == 0:
-                self.temperature = initial_temp * (1 - i / iterations)
-            
-            # Výpis průběhu
-            if print_progress and (i + 1) % 1000 == 0:
-                print(f"Iterace {i+1}/{iterations}, nejlepší fitness: {best_fitness:.4f}")
-                print(f"Ukázka textu: {best_text[:100]}")
+        # Výpis průběhu
+        if print_progress:
+            for n, checkpoint_perm in enumerate(checkpoints, 1):
+                checkpoint_fitness = self._calculate_fitness(checkpoint_perm, left, right)
+                print(f"Iterace {n * report_every}/{iterations}, nejlepší fitness: {checkpoint_fitness:.4f}")
+                print(f"Ukázka textu: {self._decrypt_with_perm(ciphertext[:100], checkpoint_perm)}")
+                print()
+            if done < iterations:
+                print(f"Výpočet ukončen po {done} iteracích - nejlepší řešení se {patience} iterací nezlepšilo")
                 print()
         
-        # Obnov původní teplotu
-        self.temperature = initial_temp
-        
-        return best_key, best_text, fitness_history
+        best_key = self._perm_to_key(best_perm)
+        best_text = self._decrypt_with_perm(ciphertext, best_perm)
+        return best_key, best_text, float(best_fitness), fitness_history if track_history else None
     
-    def break_cipher_multiple_attempts(self, ciphertext: str, attempts: int = 5, iterations_per_attempt: int = 20000) -> Tuple[Dict[str, str], str]:
+    def break_cipher_multiple_attempts(self, ciphertext: str, attempts: int = 5, iterations_per_attempt: int = 20000,
+                                       patience: Optional[int] = None,
+                                       temperature: Optional[float] = None,
+                                       seed: Optional[int] = None) -> Tuple[Dict[str, str], str]:
         """
         Pokusí se prolomit šifru vícekrát a vrátí nejlepší výsledek.
         
@@ -128,42 +454,88 @@ class MetropolisHastingsCryptanalysis:
             ciphertext: Zašifrovaný text.
             attempts: Počet pokusů.
             iterations_per_attempt: Počet iterací na pokus.
+            patience: Po kolika iteracích bez zlepšení pokus skončí (None = nikdy).
+                Počítá se od začátku běhu, kdy je řetězec ještě horký, proto je
+                vhodné jen pro dostatečně nízkou počáteční teplotu.
+            temperature: Počáteční teplota pro tyto pokusy (None = teplota instance).
+            seed: Semínko generátoru náhodných čísel (None = náhodné).
             
         Returns:
-            Tuple obsahující nejlepší klíč a dešifrovaný text.
+            Tuple obsahující nejlepší klíč a dešifrovaný text
+            (None a prázdný text, pokud se neprovedl žádný pokus).
         """
-        best_overall_key = None
-        best_overall_text = ""
-        best_overall_fitness = float('-inf')
+        if attempts < 1:
+            print(f"\nNejlepší celková fitness: {float('-inf'):.4f}")
+            return None, ""
         
-        for attempt in range(attempts):
-            print(f"\nPokus {attempt + 1}/{attempts}")
-            key, text, _ = self.metropolis_hastings(ciphertext, iterations_per_attempt, 
-                                                   print_progress=True)
-            fitness = self._calculate_fitness(text)
-            
-            if fitness > best_overall_fitness:
-                best_overall_fitness = fitness
-                best_overall_key = key
-                best_overall_text = text
+        left, right = self._encode_bigrams(ciphertext)
+        if len(left) == 0:
+            key, text, _, _ = self.metropolis_hastings(ciphertext, iterations_per_attempt, print_progress=False,
+                                                       seed=seed, patience=patience, temperature=temperature)
+            return key, text
+        pair_index, pair_start = self._index_pairs_by_char(left, right)
+        
+        # Pokusy jsou nezávislé, a proto běží paralelně - každý s vlastním klíčem a semínkem
+        # z nezávislého proudu odvozeného ze společného semínka
+        starts = [self._random_start(np.random.default_rng(child))
+                  for child in np.random.SeedSequence(seed).spawn(attempts)]
+        initial_perms = np.stack([perm for perm, _ in starts])
+        seeds = np.array([core_seed for _, core_seed in starts], dtype=np.int64)
+        initial_temp = self._initial_temperature(temperature, left, right, pair_index, pair_start,
+                                                 initial_perms[0], seeds[0])
+        best_fitnesses, best_perms = _mh_core_multi(
+            left, right, self.log_ref, pair_index, pair_start, initial_perms,
+            iterations_per_attempt, initial_temp,
+            self._cooling_alpha(iterations_per_attempt), self.epoch_len,
+            iterations_per_attempt if patience is None else patience, seeds
+        )
+        
+        for attempt, fitness in enumerate(best_fitnesses, 1):
+            print(f"Pokus {attempt}/{attempts}, nejlepší fitness: {fitness:.4f}")
+        
+        best_attempt = int(np.argmax(best_fitnesses))
+        best_overall_key = self._perm_to_key(best_perms[best_attempt])
+        best_overall_text = self._decrypt_with_perm(ciphertext, best_perms[best_attempt])
         
-        print(f"\nNejlepší celková fitness: {best_overall_fitness:.4f}")
+        print(f"\nNejlepší celková fitness: {best_fitnesses[best_attempt]:.4f}")
         return best_overall_key, best_overall_text
 
 
+@lru_cache(maxsize=None)
 def load_reference_matrix():
-    """Načte uloženou referenční bigramovou matici."""
+    """
+    Načte uloženou referenční bigramovou matici.
+    
+    Matice se mapuje do paměti (mmap), takže ji více procesů sdílí
+    bez vlastních kopií. V rámci procesu se načte jen jednou a další
+    volání vrací tutéž matici (pouze pro čtení).
+    """
     try:
-        with open('data/czech_bigram_data.pkl', 'rb') as f:
-            data = pickle.load(f)
-            return data['matrix']
+        return np.load('data/czech_bigram_matrix.npy', mmap_mode='r')
     except FileNotFoundError:
         print("Referenční matice nenalezena, vytvářím novou...")
         from create_bigram_matrix import create_and_save_bigram_matrix
         matrix, _ = create_and_save_bigram_matrix()
+        matrix.setflags(write=False)
         return matrix
 
 
+@lru_cache(maxsize=None)
+def load_log_reference_matrix():
+    """
+    Načte předpočítané logaritmy referenční bigramové matice.
+    
+    Pokud uložené logaritmy neexistují, spočítají se z referenční matice.
+    Stejně jako load_reference_matrix se v rámci procesu načtou jen jednou.
+    """
+    try:
+        return np.load('data/czech_log_bigram_matrix.npy', mmap_mode='r')
+    except FileNotFoundError:
+        log_matrix = BigramAnalysis.log_matrix(load_reference_matrix())
+        log_matrix.setflags(write=False)
+        return log_matrix
+
+
 if __name__ == "__main__":
     # Test kryptoanalýzy
     cipher = SubstitutionCipher()
@@ -184,7 +556,7 @@ if __name__ == "__main__":
     
     # Kryptoanalýza
     cryptanalysis = MetropolisHastingsCryptanalysis(ref_matrix, temperature=2.0)
-    found_key, decrypted, history = cryptanalysis.metropolis_hastings(encrypted, iterations=5000)
+    found_key, decrypted, fitness, history = cryptanalysis.metropolis_hastings(encrypted, iterations=5000, track_history=True)
     
     print(f"\nDešifrovaný text: {decrypted}")
     print(f"Nalezený klíč: {cipher.key_to_string(found_key)}")
@@ -4,28 +4,48 @@ Skript pro dešifrování všech testovacích souborů.
 
 import os
 import glob
-from cryptanalysis import MetropolisHastingsCryptanalysis, load_reference_matrix
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from cryptanalysis import MetropolisHastingsCryptanalysis, load_reference_matrix, load_log_reference_matrix
 from substitution_cipher import SubstitutionCipher
 import time
+from typing import List, Optional
 
 
-def decrypt_file(filepath: str, cryptanalysis: MetropolisHastingsCryptanalysis, 
-                 cipher: SubstitutionCipher, iterations: int = 20000):
+def decrypt_file(filepath: str, ref_matrix: Optional[np.ndarray] = None, iterations: int = 20000,
+                 temperature: float = 2.0):
     """
     Dešifruje jeden soubor.
     
+    Instance šifry a kryptoanalýzy si funkce vytváří sama, aby ji bylo možné
+    spouštět v samostatných procesech. Průběh nevypisuje, ale vrací jako řádky
+    výpisu, aby se výpisy souběžně zpracovávaných souborů nepromíchaly.
+    
     Args:
         filepath: Cesta k zašifrovanému souboru.
-        cryptanalysis: Instance kryptoanalýzy.
-        cipher: Instance šifry.
+        ref_matrix: Referenční bigramová matice (None = namapuje se uložená matice
+            i s předpočítanými logaritmy).
         iterations: Počet iterací algoritmu.
+        temperature: Počáteční teplota Metropolis-Hastings algoritmu.
+        
+    Returns:
+        Tuple obsahující dešifrovaný text, nalezený klíč, jeho fitness a řádky výpisu.
     """
+    report: List[str] = []
+    log_ref_matrix = None
+    if ref_matrix is None:
+        ref_matrix = load_reference_matrix()
+        log_ref_matrix = load_log_reference_matrix()
+    cipher = SubstitutionCipher()
+    cryptanalysis = MetropolisHastingsCryptanalysis(ref_matrix, temperature=temperature,
+                                                    log_reference_matrix=log_ref_matrix)
+    
     # Načti zašifrovaný text
     with open(filepath, 'r', encoding='utf-8') as f:
         ciphertext = f.read().strip()
     
-    print(f"\nDešifruji soubor: {os.path.basename(filepath)}")
-    print(f"Délka textu: {len(ciphertext)} znaků")
+    report.append(f"\nDešifruji soubor: {os.path.basename(filepath)}")
+    report.append(f"Délka textu: {len(ciphertext)} znaků")
     
     # Extrakce informací z názvu souboru
     filename = os.path.basename(filepath)
@@ -35,13 +55,13 @@ def decrypt_file(filepath: str, cryptanalysis: MetropolisHastingsCryptanalysis,
     
     # Dešifrování
     start_time = time.time()
-    best_key, best_text, fitness_history = cryptanalysis.metropolis_hastings(
+    best_key, best_text, best_fitness, _ = cryptanalysis.metropolis_hastings(
         ciphertext, iterations=iterations, print_progress=False
     )
     end_time = time.time()
     
-    print(f"Dešifrování dokončeno za {end_time - start_time:.2f} sekund")
-    print(f"Konečná shoda: {fitness_history[-1]:.4f}") # Větší číslo je lepší (je to log takže to ukazuje zaporne hodnoty)
+    report.append(f"Dešifrování dokončeno za {end_time - start_time:.2f} sekund")
+    report.append(f"Konečná shoda: {best_fitness:.4f}") # Větší číslo je lepší (je to log takže to ukazuje zaporne hodnoty)
     
     # Uložení výsledků
     output_dir = "decrypted_results"
@@ -59,9 +79,9 @@ def decrypt_file(filepath: str, cryptanalysis: MetropolisHastingsCryptanalysis,
     with open(key_path, 'w', encoding='utf-8') as f:
         f.write(cipher.key_to_string(best_key))
     
-    print(f"Výsledky uloženy: {plaintext_filename}, {key_filename}")
+    report.append(f"Výsledky uloženy: {plaintext_filename}, {key_filename}")
     
-    return best_text, best_key, fitness_history[-1]
+    return best_text, best_key, best_fitness, report
 
 
 def decrypt_all_test_files():
@@ -77,35 +97,38 @@ def decrypt_all_test_files():
     
     print(f"Nalezeno {len(test_files)} testovacích souborů")
     
-    # Načti referenční matici
-    ref_matrix = load_reference_matrix()
-    
-    # Inicializace
-    cipher = SubstitutionCipher()
-    cryptanalysis = MetropolisHastingsCryptanalysis(ref_matrix, temperature=2.0)
+    # Ověř, že referenční matice existuje (procesy si ji pak samy namapují do paměti)
+    load_reference_matrix()
     
     # Statistiky
     results = []
     
-    # Zpracuj každý soubor
-    for i, filepath in enumerate(sorted(test_files), 1):
-        print(f"\n{'='*60}")
-        print(f"Zpracovávám soubor {i}/{len(test_files)}")
+    # Soubory jsou na sobě nezávislé, a proto se dešifrují paralelně ve více procesech
+    test_files = sorted(test_files)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(decrypt_file, filepath, iterations=20000)
+                   for filepath in test_files]
         
-        try:
-            plaintext, key, fitness = decrypt_file(filepath, cryptanalysis, cipher, iterations=20000)
-            results.append({
-                'file': os.path.basename(filepath),
-                'fitness': fitness,
-                'success': True
-            })
-        except Exception as e:
-            print(f"Chyba při zpracování souboru {filepath}: {e}")
-            results.append({
-                'file': os.path.basename(filepath),
-                'fitness': 0,
-                'success': False
-            })
+        # Výpisy se tisknou až zde, po souborech a ve stálém pořadí
+        for i, (filepath, future) in enumerate(zip(test_files, futures), 1):
+            print(f"\n{'='*60}")
+            print(f"Zpracovávám soubor {i}/{len(test_files)}")
+            
+            try:
+                plaintext, key, fitness, report = future.result()
+                print('\n'.join(report))
+                results.append({
+                    'file': os.path.basename(filepath),
+                    'fitness': fitness,
+                    'success': True
+                })
+            except Exception as e:
+                print(f"Chyba při zpracování souboru {filepath}: {e}")
+                results.append({
+                    'file': os.path.basename(filepath),
+                    'fitness': 0,
+                    'success': False
+                })
     
     # Souhrn výsledků
     print(f"\n{'='*60}")
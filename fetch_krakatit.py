@@ -6,10 +6,90 @@ import requests
 import re
 from substitution_cipher import SubstitutionCipher
 import os
+import shelve
 import time
+from concurrent.futures import ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+# Kolik kapitol se stahuje najednou - víc by zbytečně zatěžovalo server
+MAX_CONCURRENT_REQUESTS = 5
+
+# Diskový cache předpřipravených kapitol - opakované spuštění stáhne jen chybějící kapitoly.
+# Cache ukládá výstup html_to_text a preprocess_text, proto je verze zpracování součástí
+# cesty; při každé změně zpracování textu je nutné verzi zvýšit, jinak by se používal starý text
+CHAPTER_CACHE_VERSION = 2
+CHAPTER_CACHE_PATH = f'data/krakatit_cache_v{CHAPTER_CACHE_VERSION}'
+
+# Předkompilované výrazy pro html_to_text; značky a entity se odstraňují ve dvou
+# průchodech (nejdřív značky), jinak by entita mohla zasáhnout do značky
+HTML_TAG = re.compile(r'<[^>]+>')
+HTML_ENTITY = re.compile(r'&[^;]+;')
+WHITESPACE = re.compile(r'\s+')
+
+
+def html_to_text(html: str) -> str:
+    """
+    Odstraní z HTML značky a entity a sjednotí bílé znaky.
+    
+    Args:
+        html: HTML kód stránky.
+        
+    Returns:
+        str: Text stránky se slovy oddělenými jednou mezerou.
+    """
+    return WHITESPACE.sub(' ', HTML_ENTITY.sub(' ', HTML_TAG.sub(' ', html)))
+
+
+def fetch_chapter(session: requests.Session, base_url: str, chapter: str,
+                  cipher: SubstitutionCipher) -> str:
+    """
+    Stáhne jednu kapitolu a vrátí její předpřipravený text.
+    
+    Args:
+        session: Sdílená HTTP session (znovupoužívá spojení).
+        base_url: Adresa API Wikisource.
+        chapter: Název stránky kapitoly.
+        cipher: Šifra použitá pro předpřípravu textu.
+        
+    Returns:
+        str: Předpřipravený text kapitoly (prázdný, pokud se stažení nepovedlo).
+    """
+    params = {
+        'action': 'parse',
+        'format': 'json',
+        'prop': 'text',
+        'page': chapter
+    }
+    
+    print(f"Stahuji kapitolu: {chapter}")
+    
+    # Opakování v případě nejakého problému
+    max_attempts = 3
+    for attempt in range(max_attempts):
+        try:
+            response = session.get(base_url, params=params, timeout=30)
+            data = response.json()
+            
+            if 'parse' in data:
+                chapter_html = data['parse']['text']['*']
+                # Extrakce textu
+                chapter_text = html_to_text(chapter_html)
+                
+                # Předpřiprav text
+                return cipher.preprocess_text(chapter_text)
+            return ''
+            
+        except Exception as e:
+            if attempt < max_attempts - 1:
+                print(f"  {chapter}: pokus {attempt + 1} selhal, zkouším znovu...")
+                time.sleep(2)  # Nechci dostat ip ban a přetěžovat server 
+            else:
+                print(f"  Nelze stáhnout kapitolu {chapter}: {e}")
+                # Pokračuj s dalšími kapitolami i když jedna selže
+    return ''
+
+
 def fetch_krakatit_from_wikisource():
     """Stáhne kompletní text Krakatitu včetně všech kapitol z Wikisource. Link lze použít jiný"""
     base_url = "https://cs.wikisource.org/w/api.php" 
@@ -23,7 +103,7 @@ def fetch_krakatit_from_wikisource():
         backoff_factor=0.3,
         status_forcelist=(500, 502, 504)
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=MAX_CONCURRENT_REQUESTS)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     
@@ -50,42 +130,28 @@ def fetch_krakatit_from_wikisource():
     
     print(f"Nalezeno {len(chapter_links)} kapitol")
     
-    full_text = []
     cipher = SubstitutionCipher()
+    chapters = sorted(chapter_links)
     
-    # Stahuje každou kapitolu
-    for i, chapter in enumerate(sorted(chapter_links), 1):
-        print(f"Stahuji kapitolu {i}/{len(chapter_links)}: {chapter}")
+    with shelve.open(CHAPTER_CACHE_PATH) as cache:
+        missing = [chapter for chapter in chapters if chapter not in cache]
+        print(f"V cache je {len(chapters) - len(missing)} kapitol, stahuji {len(missing)}")
         
-        params['page'] = chapter
+        # Stahování je omezené sítí, ne procesorem - kapitoly se proto stahují souběžně
+        # přes sdílenou session; map() zachová pořadí kapitol
+        print(f"Stahuji kapitoly (nejvýše {MAX_CONCURRENT_REQUESTS} najednou)...")
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            fetched = list(executor.map(
+                lambda chapter: fetch_chapter(session, base_url, chapter, cipher), missing))
         
-        # Opakování v případě nejakého problému
-        max_attempts = 3
-        for attempt in range(max_attempts):
-            try:
-                response = session.get(base_url, params=params, timeout=30)
-                data = response.json()
-                
-                if 'parse' in data:
-                    chapter_html = data['parse']['text']['*']
-                    # Extrakce textu
-                    chapter_text = re.sub(r'<[^>]+>', ' ', chapter_html)
-                    chapter_text = re.sub(r'&[^;]+;', ' ', chapter_text)
-                    chapter_text = re.sub(r'\s+', ' ', chapter_text)
-                    
-                    # Předpřiprav text
-                    processed = cipher.preprocess_text(chapter_text)
-                    if processed:
-                        full_text.append(processed)
-                break  # Úspěch, pokračuj na další kapitolu
-                
-            except Exception as e:
-                if attempt < max_attempts - 1:
-                    print(f"  Pokus {attempt + 1} selhal, zkouším znovu...")
-                    time.sleep(2)  # Nechci dostat ip ban a přetěžovat server 
-                else:
-                    print(f"  Nelze stáhnout kapitolu {chapter}: {e}")
-                    # Pokračuj s dalšími kapitolami i když jedna selže
+        # Do cache se zapisuje až zde v hlavním vlákně (shelve není thread-safe);
+        # nepovedená stažení se neukládají, aby se příště zkusila znovu
+        for chapter, text in zip(missing, fetched):
+            if text:
+                cache[chapter] = text
+        
+        full_text = [cache[chapter] for chapter in chapters if chapter in cache]
+    print(f"Staženo {len(full_text)}/{len(chapters)} kapitol")
     
     return '_'.join(full_text)
 
@@ -3,11 +3,76 @@ Knihovna pro šifrování, dešifrování a kryptoanalýzu substituční šifry.
 """
 
 import random
+import re
 import string
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 
 
+# Tabulky pro bytes.translate v preprocess_text: mezera se převede na podtržítko,
+# všechny ostatní bajty kromě A-Z se zahodí
+SPACE_TO_UNDERSCORE = bytes.maketrans(b' ', b'_')
+NON_ALPHABET_BYTES = bytes(b for b in range(256) if chr(b) not in string.ascii_uppercase + ' ')
+MULTIPLE_UNDERSCORES = re.compile(r'__+')
+
+
+def make_index_lut(alphabet: str) -> np.ndarray:
+    """
+    Vytvoří tabulku kódový bod -> index znaku abecedy pro encode_indices.
+    
+    Tabulka pokrývá aspoň všechny bajty a její poslední položka leží vždy mimo abecedu.
+    
+    Args:
+        alphabet: Použitá abeceda.
+        
+    Returns:
+        np.ndarray: Tabulka indexů; znaky mimo abecedu mají index len(alphabet).
+    """
+    alphabet_size = len(alphabet)
+    codes = np.fromiter(map(ord, alphabet), dtype=np.int64, count=alphabet_size)
+    index_lut = np.full(max(256, int(codes.max(initial=0)) + 2), alphabet_size,
+                        dtype=np.min_scalar_type(alphabet_size))
+    index_lut[codes] = np.arange(alphabet_size)
+    return index_lut
+
+
+def encode_indices(text: str, index_lut: np.ndarray) -> np.ndarray:
+    """
+    Převede text na pole indexů znaků abecedy.
+    
+    Args:
+        text: Text k převodu.
+        index_lut: Tabulka indexů (viz make_index_lut).
+        
+    Returns:
+        np.ndarray: Pole indexů; znaky mimo abecedu mají index velikosti abecedy.
+    """
+    # ASCII text se převede rovnou po bajtech, ostatní po kódových bodech - kódové body
+    # za koncem tabulky připadnou na její poslední položku, tedy mimo abecedu
+    if text.isascii():
+        codes = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    else:
+        codes = np.fromiter(map(ord, text), dtype=np.int64, count=len(text))
+        np.minimum(codes, len(index_lut) - 1, out=codes)
+    return index_lut[codes]
+
+
+def bigram_pairs(indices: np.ndarray, alphabet_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vrátí indexy prvních a druhých znaků všech bigramů složených ze znaků abecedy.
+    
+    Args:
+        indices: Pole indexů znaků (viz encode_indices).
+        alphabet_size: Velikost abecedy.
+        
+    Returns:
+        Tuple obsahující pole indexů prvních a druhých znaků bigramů.
+    """
+    valid = indices < alphabet_size
+    pair_mask = valid[:-1] & valid[1:]
+    return indices[:-1][pair_mask], indices[1:][pair_mask]
+
+
 class SubstitutionCipher:
     """Třída pro práci se substituční šifrou."""
     
@@ -16,6 +81,10 @@ class SubstitutionCipher:
         self.alphabet = string.ascii_uppercase + '_'
         self.alphabet_size = len(self.alphabet)
         
+        # Pro práci s textem jako s polem indexů (viz text_to_indices a indices_to_text)
+        self.alphabet_bytes = np.frombuffer(self.alphabet.encode('ascii'), dtype=np.uint8)
+        self.index_lut = make_index_lut(self.alphabet)
+        
     def generate_random_key(self) -> Dict[str, str]:
         """
         Vygeneruje náhodný klíč (permutaci abecedy).
@@ -53,6 +122,85 @@ class SubstitutionCipher:
             raise ValueError(f"Klíč musí mít délku {self.alphabet_size}")
         return dict(zip(self.alphabet, key_string))
     
+    def key_to_array(self, key: Dict[str, str]) -> np.ndarray:
+        """
+        Převede klíč na permutaci indexů.
+        
+        Args:
+            key: Slovník reprezentující klíč.
+            
+        Returns:
+            np.ndarray: Pole, kde key_array[index původního znaku] = index šifrového znaku.
+        """
+        return self.text_to_indices(self.key_to_string(key))
+    
+    def array_to_key(self, key_array: np.ndarray) -> Dict[str, str]:
+        """
+        Převede permutaci indexů zpět na klíč.
+        
+        Args:
+            key_array: Permutace indexů (viz key_to_array).
+            
+        Returns:
+            Dict[str, str]: Slovník mapující původní znaky na šifrované.
+        """
+        return self.string_to_key(self.indices_to_text(key_array))
+    
+    def text_to_indices(self, text: str) -> np.ndarray:
+        """
+        Převede text na pole indexů znaků abecedy.
+        
+        Args:
+            text: Text k převodu.
+            
+        Returns:
+            np.ndarray: Pole uint8 indexů; znaky mimo abecedu mají index alphabet_size.
+        """
+        return encode_indices(text, self.index_lut)
+    
+    def indices_to_text(self, indices: np.ndarray) -> str:
+        """
+        Převede pole indexů zpět na text.
+        
+        Args:
+            indices: Pole indexů znaků (viz text_to_indices).
+            
+        Returns:
+            str: Text; indexy mimo abecedu se převedou na '?'.
+        """
+        table = np.append(self.alphabet_bytes, np.uint8(ord('?')))
+        return table[indices].tobytes().decode('ascii')
+    
+    def encrypt_indices(self, indices: np.ndarray, key_array: np.ndarray) -> np.ndarray:
+        """
+        Zašifruje text zadaný jako pole indexů.
+        
+        Args:
+            indices: Pole indexů znaků (viz text_to_indices).
+            key_array: Klíč jako permutace indexů (viz key_to_array).
+            
+        Returns:
+            np.ndarray: Pole indexů zašifrovaného textu; znaky mimo abecedu zůstanou beze změny.
+        """
+        return np.append(key_array, np.uint8(self.alphabet_size))[indices]
+    
+    def decrypt_indices(self, indices: np.ndarray, key_array: np.ndarray) -> np.ndarray:
+        """
+        Dešifruje text zadaný jako pole indexů.
+        
+        Args:
+            indices: Pole indexů zašifrovaného textu (viz text_to_indices).
+            key_array: Klíč jako permutace indexů (viz key_to_array).
+            
+        Returns:
+            np.ndarray: Pole indexů dešifrovaného textu; znaky mimo abecedu zůstanou beze změny.
+        """
+        # Inverzní permutace: inverse[key_array[i]] = i
+        inverse = np.empty(self.alphabet_size + 1, dtype=np.uint8)
+        inverse[key_array] = np.arange(self.alphabet_size, dtype=np.uint8)
+        inverse[self.alphabet_size] = self.alphabet_size
+        return inverse[indices]
+    
     def encrypt(self, plaintext: str, key: Dict[str, str]) -> str:
         """
         Zašifruje text pomocí daného klíče.
@@ -64,7 +212,8 @@ class SubstitutionCipher:
         Returns:
             str: Zašifrovaný text.
         """
-        return ''.join(key.get(char, char) for char in plaintext)
+        # str.translate mapuje znaky v C, bez Python smyčky přes text
+        return plaintext.translate(str.maketrans(key))
     
     def decrypt(self, ciphertext: str, key: Dict[str, str]) -> str:
         """
@@ -79,7 +228,7 @@ class SubstitutionCipher:
         """
         # Vytvoříme inverzní klíč
         inverse_key = {v: k for k, v in key.items()}
-        return ''.join(inverse_key.get(char, char) for char in ciphertext)
+        return ciphertext.translate(str.maketrans(inverse_key))
     
     def preprocess_text(self, text: str) -> str:
         """
@@ -104,20 +253,12 @@ class SubstitutionCipher:
         for czech_char, latin_char in replacements.items():
             text = text.replace(czech_char, latin_char)
         
-        # Náhrada mezer podtržítky a odstranění ostatních znaků
-        result = []
-        for char in text:
-            if char in string.ascii_uppercase:
-                result.append(char)
-            elif char == ' ':
-                result.append('_')
+        # Náhrada mezer podtržítky a odstranění ostatních znaků - zbylé znaky mimo ASCII
+        # zahodí už kódování, zbytek jeden průchod bytes.translate
+        processed = text.encode('ascii', 'ignore').translate(SPACE_TO_UNDERSCORE, NON_ALPHABET_BYTES)
         
         # Odstranění vícenásobných podtržítek
-        processed = ''.join(result)
-        while '__' in processed:
-            processed = processed.replace('__', '_')
-        
-        return processed
+        return MULTIPLE_UNDERSCORES.sub('_', processed.decode('ascii'))
 
 
 class BigramAnalysis:
@@ -133,6 +274,19 @@ class BigramAnalysis:
         self.alphabet = alphabet
         self.alphabet_size = len(alphabet)
         self.char_to_index = {char: i for i, char in enumerate(alphabet)}
+        self.index_lut = make_index_lut(alphabet)
+    
+    def _bigram_indices(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vrátí indexy prvních a druhých znaků všech bigramů textu složených ze znaků abecedy.
+        
+        Args:
+            text: Text pro analýzu.
+            
+        Returns:
+            Tuple obsahující pole indexů prvních a druhých znaků bigramů.
+        """
+        return bigram_pairs(encode_indices(text, self.index_lut), self.alphabet_size)
     
     def create_bigram_matrix(self, text: str) -> np.ndarray:
         """
@@ -144,15 +298,12 @@ class BigramAnalysis:
         Returns:
             np.ndarray: Matice pravděpodobností bigramů.
         """
-        # Inicializace matice s pseudocounty pro vyhlazení
-        matrix = np.ones((self.alphabet_size, self.alphabet_size)) * 0.5
+        # Počítání bigramů najednou přes indexy v rozbalené matici
+        rows, cols = self._bigram_indices(text)
+        counts = np.bincount(rows.astype(np.int64) * self.alphabet_size + cols, minlength=self.alphabet_size ** 2)
         
-        # Počítání bigramů
-        for i in range(len(text) - 1):
-            if text[i] in self.char_to_index and text[i + 1] in self.char_to_index:
-                row = self.char_to_index[text[i]]
-                col = self.char_to_index[text[i + 1]]
-                matrix[row, col] += 1
+        # Přičtení pseudocountů pro vyhlazení
+        matrix = counts.reshape(self.alphabet_size, self.alphabet_size) + 0.5
         
         # Normalizace na pravděpodobnosti
         row_sums = matrix.sum(axis=1)
@@ -160,27 +311,56 @@ class BigramAnalysis:
         
         return matrix
     
-    def calculate_bigram_score(self, text: str, reference_matrix: np.ndarray) -> float:
+    @staticmethod
+    def log_matrix(matrix: np.ndarray) -> np.ndarray:
+        """
+        Převede matici pravděpodobností na logaritmy pro rychlé skórování.
+        
+        Args:
+            matrix: Matice pravděpodobností bigramů.
+            
+        Returns:
+            np.ndarray: Souvislá float32 matice log-pravděpodobností.
+        """
+        return np.ascontiguousarray(np.log(matrix.astype(np.float32) + np.float32(1e-12)))
+    
+    @staticmethod
+    def exact_log_matrix(matrix: np.ndarray) -> np.ndarray:
+        """
+        Převede matici pravděpodobností na logaritmy bez vyhlazení.
+        
+        Nulové pravděpodobnosti dostanou -inf, takže je calculate_bigram_score vynechá.
+        
+        Args:
+            matrix: Matice pravděpodobností bigramů.
+            
+        Returns:
+            np.ndarray: Matice log-pravděpodobností.
+        """
+        return np.log(matrix, out=np.full(matrix.shape, -np.inf), where=matrix > 0)
+    
+    def calculate_bigram_score(self, text: str, reference_matrix: np.ndarray,
+                               log_reference_matrix: Optional[np.ndarray] = None) -> float:
         """
         Vypočítá skóre textu podle reference bigramové matice.
         
         Args:
             text: Text k vyhodnocení.
             reference_matrix: Referenční bigramová matice.
+            log_reference_matrix: Předpočítané logaritmy referenční matice
+                (viz exact_log_matrix); None = spočítají se z reference_matrix.
             
         Returns:
             float: Log-pravděpodobnost textu.
         """
-        score = 0.0
-        count = 0
+        # Logaritmuje se jen tabulka abeceda x abeceda, ne každý bigram textu
+        if log_reference_matrix is None:
+            log_reference_matrix = self.exact_log_matrix(reference_matrix)
         
-        for i in range(len(text) - 1):
-            if text[i] in self.char_to_index and text[i + 1] in self.char_to_index:
-                row = self.char_to_index[text[i]]
-                col = self.char_to_index[text[i + 1]]
-                prob = reference_matrix[row, col]
-                if prob > 0:
-                    score += np.log(prob)
-                    count += 1
+        rows, cols = self._bigram_indices(text)
+        log_probs = log_reference_matrix[rows, cols]
+        log_probs = log_probs[log_probs > -np.inf]
         
-        return score / count if count > 0 else float('-inf')
\ No newline at end of file
+        if len(log_probs) == 0:
+            return float('-inf')
+        return float(log_probs.sum() / len(log_probs))
\ No newline at end of file